@@ -1,8 +1,11 @@
 import streamlit as st
+from dataclasses import dataclass
 from datetime import datetime, date, time, timedelta
 from zoneinfo import ZoneInfo
 import uuid
 
+import numpy as np
+
 TZ = ZoneInfo("Asia/Taipei")
 
 # ============================
@@ -11,170 +14,201 @@ TZ = ZoneInfo("Asia/Taipei")
 IMPORTANCE_THRESHOLD = 4   # 重要性 >=4 視為重要
 URGENT_DAYS = 1            # 截止日 <= 明天 視為急
 BUFFER_RATIO = 0.20        # 排程保留 20% 緩衝
-ENSURE_Q2 = 1              # 至少先排 1 個 Q2
 
 
 # ----------------------------
 # Core logic
 # ----------------------------
-def compute_quadrant(task, tomorrow,
-                     importance_threshold=IMPORTANCE_THRESHOLD,
-                     urgent_days=URGENT_DAYS):
-    """
-    固定版本：
-    - important: importance >= IMPORTANCE_THRESHOLD
-    - urgent: due_date <= tomorrow + (urgent_days-1)
-    """
-    important = task["importance"] >= importance_threshold
+@dataclass(slots=True)
+class Task:
+    id: str
+    title: str
+    duration_min: int
+    importance: int
+    due: date | None
+    status: str
 
-    due = task["due"]
-    if due is None:
-        urgent = False
-    else:
-        urgent_limit = tomorrow + timedelta(days=max(urgent_days - 1, 0))
-        urgent = due <= urgent_limit
-
-    if important and urgent:
-        return "Q1 重要且急"
-    if important and not urgent:
-        return "Q2 重要不急"
-    if (not important) and urgent:
-        return "Q3 不重要但急"
-    return "Q4 不重要不急"
 
+QUAD_LABELS = np.array(["Q1 重要且急", "Q2 重要不急", "Q3 不重要但急", "Q4 不重要不急"])
 
-def minutes_between(a_dt, b_dt):
-    return int((b_dt - a_dt).total_seconds() // 60)
+NO_DUE = np.iinfo(np.int32).max   # 無截止日的 due_ordinal
 
 
-def dt_on(day: date, t: time):
-    return datetime(day.year, day.month, day.day, t.hour, t.minute, tzinfo=TZ)
+def _tasks_soa(tasks):
+    """
+    list of Task -> 平行 NumPy 陣列（SoA）：
+    importance / due_ordinal / duration_min
+    """
+    n = len(tasks)
+    importance = np.fromiter((t.importance for t in tasks), dtype=np.int8, count=n)
+    due_ordinal = np.fromiter(
+        (t.due.toordinal() if t.due else NO_DUE for t in tasks), dtype=np.int32, count=n
+    )
+    duration_min = np.fromiter((t.duration_min for t in tasks), dtype=np.int16, count=n)
+    return importance, due_ordinal, duration_min
 
 
-def generate_schedule(tasks, tomorrow, blocks,
-                      importance_threshold=IMPORTANCE_THRESHOLD,
-                      urgent_days=URGENT_DAYS,
-                      buffer_ratio=BUFFER_RATIO,
-                      ensure_q2=ENSURE_Q2):
+def compute_quadrants_vec(imp_arr, due_arr, tomorrow_ord,
+                          importance_threshold=IMPORTANCE_THRESHOLD,
+                          urgent_days=URGENT_DAYS):
     """
-    固定版排程策略：
-    - 只排 todo
-    - 先排 Q1，再保證至少排 ensure_q2 個 Q2，接著 Q2、Q3、Q4
-    - 留 buffer_ratio 緩衝
-    - 排不下的列 overflow
+    固定版本（向量化）：
+    - important: importance >= IMPORTANCE_THRESHOLD
+    - urgent: due_date <= tomorrow + (urgent_days-1)
+    回傳 int8 象限代碼 0..3，對應 QUAD_LABELS
     """
-    todo = [t for t in tasks if t["status"] == "todo"]
-    if not todo:
-        return [], {}, {}, []
+    important = imp_arr >= importance_threshold
+    urgent = due_arr <= tomorrow_ord + max(urgent_days - 1, 0)
+    return ((~important).astype(np.int8) << 1) | (~urgent).astype(np.int8)
 
-    # 可用時間段
-    segments = []
-    for (s_t, e_t) in blocks:
-        s_dt = dt_on(tomorrow, s_t)
-        e_dt = dt_on(tomorrow, e_t)
-        if e_dt > s_dt:
-            segments.append((s_dt, e_dt))
-    if not segments:
-        return [], {}, {}, todo
 
-    total_available = sum(minutes_between(s, e) for s, e in segments)
-    sched_limit = int(total_available * (1.0 - max(0.0, min(buffer_ratio, 0.8))))
+def _partition_and_classify(tasks, tomorrow_ord,
+                            importance_threshold=IMPORTANCE_THRESHOLD,
+                            urgent_days=URGENT_DAYS):
+    """每次 rerun 算一次：篩出 todo，並回傳與 todo 平行的象限代碼"""
+    todo = [t for t in tasks if t.status == "todo"]
+    imp, due_ord, _ = _tasks_soa(todo)
+    return todo, compute_quadrants_vec(imp, due_ord, tomorrow_ord,
+                                       importance_threshold, urgent_days)
 
-    # 分類 + 排序 key
-    enriched = []
-    for t in todo:
-        q = compute_quadrant(t, tomorrow, importance_threshold, urgent_days)
-        due_key = t["due"].toordinal() if t["due"] else 10**9
-        enriched.append((t, q, due_key))
-
-    # 拆四群
-    q1 = [(t, q, d) for (t, q, d) in enriched if q.startswith("Q1")]
-    q2 = [(t, q, d) for (t, q, d) in enriched if q.startswith("Q2")]
-    q3 = [(t, q, d) for (t, q, d) in enriched if q.startswith("Q3")]
-    q4 = [(t, q, d) for (t, q, d) in enriched if q.startswith("Q4")]
-
-    # 排序：截止越近越前、重要性高越前
-    q1.sort(key=lambda x: (x[2], -x[0]["importance"]))
-    q2.sort(key=lambda x: (x[2], -x[0]["importance"]))
-    q3.sort(key=lambda x: (x[2], -x[0]["importance"]))
-    q4.sort(key=lambda x: (-x[0]["importance"], x[2]))
-
-    # 保證先排幾個 Q2
-    q2_early = q2[:max(0, ensure_q2)]
-    q2_rest = q2[max(0, ensure_q2):]
-    ordered = q1 + q2_early + q2_rest + q3 + q4
 
-    # 實際塞進時間段
+def _place(durations, seg_starts, seg_ends, order, sched_limit):
+    """
+    依 order 把任務塞進時間段（整數分鐘，游標只往前）：
+    回傳 starts、ends、placed_mask（皆與 durations 平行）
+    """
+    n = durations.shape[0]
+    n_seg = seg_starts.shape[0]
+    starts = np.zeros(n, dtype=np.int32)
+    ends = np.zeros(n, dtype=np.int32)
+    placed_mask = np.zeros(n, dtype=np.bool_)
+
     used = 0
     seg_idx = 0
-    cursor = segments[0][0]
-
-    def move_cursor(si, cur):
-        while si < len(segments):
-            s, e = segments[si]
-            if cur < s:
-                cur = s
-            if cur < e:
-                return si, cur
-            si += 1
-            if si < len(segments):
-                cur = segments[si][0]
-        return si, cur
-
-    seg_idx, cursor = move_cursor(seg_idx, cursor)
-
-    schedule = []
-    overflow = []
+    cursor = seg_starts[0]
 
-    for (t, q, _) in ordered:
-        dur = int(t["duration_min"])
+    for k in range(order.shape[0]):
+        idx = order[k]
+        dur = durations[idx]
 
         if used + dur > sched_limit:
-            overflow.append(t)
             continue
 
-        placed = False
-        while seg_idx < len(segments):
-            seg_idx, cursor = move_cursor(seg_idx, cursor)
-            if seg_idx >= len(segments):
-                break
-
-            s, e = segments[seg_idx]
-            remaining = minutes_between(cursor, e)
+        while seg_idx < n_seg:
+            if cursor < seg_starts[seg_idx]:
+                cursor = seg_starts[seg_idx]
+            remaining = seg_ends[seg_idx] - cursor
             if remaining <= 0:
                 seg_idx += 1
+                if seg_idx < n_seg:
+                    cursor = seg_starts[seg_idx]
                 continue
 
             if dur <= remaining:
-                start = cursor
-                end = cursor + timedelta(minutes=dur)
-                cursor = end
+                starts[idx] = cursor
+                ends[idx] = cursor + dur
+                placed_mask[idx] = True
+                cursor += dur
                 used += dur
-                schedule.append({
-                    "start": start,
-                    "end": end,
-                    "title": t["title"],
-                    "quadrant": q,
-                    "task_id": t["id"],
-                })
-                placed = True
                 break
-            else:
-                seg_idx += 1
+            seg_idx += 1
 
-        if not placed:
-            overflow.append(t)
+    return starts, ends, placed_mask
 
-    # 四象限清單
-    quad_map = {"Q1 重要且急": [], "Q2 重要不急": [], "Q3 不重要但急": [], "Q4 不重要不急": []}
-    for (t, q, _) in enriched:
-        quad_map[q].append(t)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _generate_schedule_pure(dur_min, imp, due_ord, codes, spans, buffer_ratio):
+    """
+    排程純計算（整數分鐘，輸入皆可 hash，交給 st.cache_data 快取）：
+    - spans: ((start_min, end_min), ...) 已濾掉空段
+    - 回傳 placed ((idx, start_min, end_min), ...)、overflow (idx, ...)、meta
+    """
+    seg_starts_min = np.array([s for s, _ in spans], dtype=np.int32)
+    seg_ends_min = np.array([e for _, e in spans], dtype=np.int32)
+
+    total_available = int((seg_ends_min - seg_starts_min).sum())
+    sched_limit = int(total_available * (1.0 - max(0.0, min(buffer_ratio, 0.8))))
+
+    # 排序：Q1 → Q2 → Q3 → Q4；Q1~Q3 截止越近越前、重要性高越前，Q4 重要性優先
+    # lexsort 以最後一個 key 為主，且為穩定排序
+    neg_imp = -imp.astype(np.int32)
+    is_q4 = codes == 3
+    primary_key = np.where(is_q4, neg_imp, due_ord)
+    secondary_key = np.where(is_q4, due_ord, neg_imp)
+    order = np.lexsort((secondary_key, primary_key, codes))
+
+    # 實際塞進時間段
+    durations = dur_min.astype(np.int32)
+    starts, ends, placed_mask = _place(durations, seg_starts_min, seg_ends_min, order, sched_limit)
+
+    placed_order = order[placed_mask[order]]
+    placed = tuple(zip(placed_order.tolist(),
+                       starts[placed_order].tolist(),
+                       ends[placed_order].tolist()))
+    overflow = tuple(order[~placed_mask[order]].tolist())
+    used = int(durations[placed_mask].sum())
 
     meta = {
         "total_available_min": total_available,
         "sched_limit_min": sched_limit,
         "used_min": used
     }
+    return placed, overflow, meta
+
+
+def generate_schedule(tasks, tomorrow, blocks,
+                      importance_threshold=IMPORTANCE_THRESHOLD,
+                      urgent_days=URGENT_DAYS,
+                      buffer_ratio=BUFFER_RATIO,
+                      todo_codes=None):
+    """
+    固定版排程策略：
+    - 只排 todo
+    - 依 Q1、Q2、Q3、Q4 順序排
+    - 留 buffer_ratio 緩衝
+    - 排不下的列 overflow
+    - todo_codes: 已算好的象限代碼；給了代表 tasks 已是 todo，不再篩選/重算
+    """
+    tomorrow_ord = tomorrow.toordinal()
+    base = datetime(tomorrow.year, tomorrow.month, tomorrow.day, 0, 0, tzinfo=TZ)
+
+    if todo_codes is None:
+        todo, codes = _partition_and_classify(tasks, tomorrow_ord,
+                                              importance_threshold, urgent_days)
+    else:
+        todo, codes = tasks, todo_codes
+    if not todo:
+        return [], {}, {}, []
+
+    # 可用時間段（以當天 00:00 起算的分鐘數）
+    spans = tuple(
+        (s_t.hour * 60 + s_t.minute, e_t.hour * 60 + e_t.minute) for (s_t, e_t) in blocks
+    )
+    spans = tuple((s, e) for (s, e) in spans if e > s)
+    if not spans:
+        return [], {}, {}, todo
+
+    imp, due_ord, dur_min = _tasks_soa(todo)
+    placed, overflow_idx, meta = _generate_schedule_pure(
+        dur_min, imp, due_ord, codes, spans, buffer_ratio
+    )
+
+    # 最後才轉回 datetime
+    schedule = []
+    for idx, s_min, e_min in placed:
+        t = todo[idx]
+        schedule.append({
+            "start": base + timedelta(minutes=s_min),
+            "end": base + timedelta(minutes=e_min),
+            "title": t.title,
+            "quadrant": int(codes[idx]),
+            "task_id": t.id,
+        })
+    overflow = [todo[i] for i in overflow_idx]
+
+    # 四象限清單
+    quad_map = {str(QUAD_LABELS[k]): [todo[i] for i in np.nonzero(codes == k)[0]] for k in range(4)}
+
     return schedule, quad_map, meta, overflow
 
 
@@ -185,9 +219,13 @@ st.set_page_config(page_title="To Do List", layout="wide")
 
 if "tasks" not in st.session_state:
     st.session_state.tasks = []
+else:
+    # 舊版 session 存的是 dict，轉成 Task
+    st.session_state.tasks = [Task(**t) if isinstance(t, dict) else t for t in st.session_state.tasks]
 
 today = datetime.now(TZ).date()
 tomorrow = today + timedelta(days=1)
+tomorrow_ord = tomorrow.toordinal()
 
 st.title("To Do List")
 st.caption("行程推薦")
@@ -225,14 +263,14 @@ with st.sidebar:
 
     if st.button("✨ 填入範例任務", use_container_width=True):
         st.session_state.tasks.extend([
-            {"id": str(uuid.uuid4()), "title": "把明天最重要的一件事做 60 分鐘", "duration_min": 60, "importance": 5, "due": None, "status": "todo"},
-            {"id": str(uuid.uuid4()), "title": "回覆兩封信", "duration_min": 30, "importance": 3, "due": tomorrow, "status": "todo"},
-            {"id": str(uuid.uuid4()), "title": "整理桌面/雜事", "duration_min": 30, "importance": 2, "due": None, "status": "todo"},
+            Task(id=str(uuid.uuid4()), title="把明天最重要的一件事做 60 分鐘", duration_min=60, importance=5, due=None, status="todo"),
+            Task(id=str(uuid.uuid4()), title="回覆兩封信", duration_min=30, importance=3, due=tomorrow, status="todo"),
+            Task(id=str(uuid.uuid4()), title="整理桌面/雜事", duration_min=30, importance=2, due=None, status="todo"),
         ])
         st.success("已加入範例。")
 
     st.divider()
-    st.caption("固定規則：重要>=4、急=截止<=明天、緩衝20%、先排1個Q2")
+    st.caption("固定規則：重要>=4、急=截止<=明天、緩衝20%、依 Q1→Q4 排")
 
 
 # ----------------------------
@@ -259,14 +297,14 @@ with c1:
             if not title.strip():
                 st.error("任務不能空白。")
             else:
-                st.session_state.tasks.append({
-                    "id": str(uuid.uuid4()),
-                    "title": title.strip(),
-                    "duration_min": int(duration_min),
-                    "importance": int(importance),
-                    "due": due,
-                    "status": "todo",
-                })
+                st.session_state.tasks.append(Task(
+                    id=str(uuid.uuid4()),
+                    title=title.strip(),
+                    duration_min=int(duration_min),
+                    importance=int(importance),
+                    due=due,
+                    status="todo",
+                ))
                 st.success("已加入！")
 
 with c2:
@@ -279,12 +317,12 @@ with c2:
         table = []
         for t in tasks:
             table.append({
-                "任務": t["title"],
-                "時間(分)": t["duration_min"],
-                "重要性": t["importance"],
-                "截止日": t["due"].isoformat() if t["due"] else "",
-                "狀態": t["status"],
-                "id": t["id"],
+                "任務": t.title,
+                "時間(分)": t.duration_min,
+                "重要性": t.importance,
+                "截止日": t.due.isoformat() if t.due else "",
+                "狀態": t.status,
+                "id": t.id,
             })
 
         st.dataframe(
@@ -300,7 +338,7 @@ with c2:
             format_func=lambda x: next(r["任務"] for r in table if r["id"] == x),
         )
         if st.button("🗑️ 刪除選取任務", use_container_width=True):
-            st.session_state.tasks = [t for t in st.session_state.tasks if t["id"] != pick]
+            st.session_state.tasks = [t for t in st.session_state.tasks if t.id != pick]
             st.success("已刪除。")
 
 st.divider()
@@ -308,30 +346,27 @@ st.divider()
 st.subheader("③ 一鍵生成：明天行程")
 gen = st.button("🚀 產生明日行程", use_container_width=True)
 
-tasks = st.session_state.tasks
-todo = [t for t in tasks if t["status"] == "todo"]
+todo, todo_codes = _partition_and_classify(st.session_state.tasks, tomorrow_ord)
 
 # 四象限顯示（固定規則）
-quad_now = {"Q1 重要且急": [], "Q2 重要不急": [], "Q3 不重要但急": [], "Q4 不重要不急": []}
-for t in todo:
-    q = compute_quadrant(t, tomorrow)
-    quad_now[q].append(t)
+quad_now = [[todo[i] for i in np.nonzero(todo_codes == k)[0]] for k in range(4)]
 
 qcol1, qcol2, qcol3, qcol4 = st.columns(4)
-for col, qname in zip([qcol1, qcol2, qcol3, qcol4], quad_now.keys()):
+for k, col in enumerate([qcol1, qcol2, qcol3, qcol4]):
     with col:
-        st.markdown(f"### {qname}")
-        if not quad_now[qname]:
+        st.markdown(f"### {QUAD_LABELS[k]}")
+        if not quad_now[k]:
             st.caption("（空）")
         else:
-            for t in quad_now[qname]:
-                st.write(f"• {t['title']} ({t['duration_min']}m)")
+            for t in quad_now[k]:
+                st.write(f"• {t.title} ({t.duration_min}m)")
 
 if gen:
     schedule, quad_map, meta, overflow = generate_schedule(
-        tasks=tasks,
+        tasks=todo,
         tomorrow=tomorrow,
         blocks=blocks,
+        todo_codes=todo_codes,
     )
 
     st.divider()
@@ -346,7 +381,7 @@ if gen:
                 "開始": it["start"].strftime("%H:%M"),
                 "結束": it["end"].strftime("%H:%M"),
                 "任務": it["title"],
-                "象限": it["quadrant"],
+                "象限": str(QUAD_LABELS[it["quadrant"]]),
             })
         st.dataframe(rows, use_container_width=True, hide_index=True)
 
@@ -357,14 +392,14 @@ if gen:
     if overflow:
         st.markdown("### ⛔ 排不下（自動延後）")
         for t in overflow:
-            st.write(f"• {t['title']} ({t['duration_min']}m)")
+            st.write(f"• {t.title} ({t.duration_min}m)")
 
     plan_lines = [f"明日行程 {tomorrow.isoformat()}"]
     for it in schedule:
-        plan_lines.append(f"- {it['start'].strftime('%H:%M')}–{it['end'].strftime('%H:%M')} {it['title']} ({it['quadrant']})")
+        plan_lines.append(f"- {it['start'].strftime('%H:%M')}–{it['end'].strftime('%H:%M')} {it['title']} ({QUAD_LABELS[it['quadrant']]})")
     if overflow:
         plan_lines.append("")
         plan_lines.append("排不下（延後）：")
         for t in overflow:
-            plan_lines.append(f"- {t['title']} ({t['duration_min']}m)")
+            plan_lines.append(f"- {t.title} ({t.duration_min}m)")
     st.text_area("📌 直接複製貼到筆記", "\n".join(plan_lines), height=220)